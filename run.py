@@ -13,6 +13,7 @@ from camel.toolkits import BrowserToolkit
 from camel.types import ModelPlatformType, ModelType
 from camel.societies import RolePlaying
 from camel.messages import BaseMessage
+from src.completion import CompletionChecker
 
 # Initialize environment
 base_dir = pathlib.Path(__file__).parent
@@ -65,7 +66,7 @@ def construct_society(search_criteria: dict) -> RolePlaying:
     2. Find and click the search input (id="data-search")
     3. Enter "{search_criteria['protein_type']}" and submit search
     4. Wait for results to load
-    5. For the first 5 dataset results:
+    5. For the first {search_criteria['num_results']} dataset results:
        - Extract the dataset title/name
        - Get the description
        - Note any visible metadata (authors, date, etc.)
@@ -75,7 +76,7 @@ def construct_society(search_criteria: dict) -> RolePlaying:
        - Any common themes or patterns
        - Relevance to {search_criteria['protein_type']} research
     
-    Please be thorough in data collection but focus only on the first 5 results.
+    Please be thorough in data collection but focus only on the first {search_criteria['num_results']} results.
     """
 
     # Configure agent parameters
@@ -111,7 +112,8 @@ def main():
     
     search_criteria = {
         "protein_type": protein_type,
-        "resolution": resolution
+        "resolution": resolution,
+        "num_results": 5
     }
 
     print(f"\nStarting search for: {protein_type} (Resolution: {resolution})")
@@ -121,10 +123,14 @@ def main():
         # Create society
         society = construct_society(search_criteria)
         
+        # Track progress towards the requested fields
+        checker = CompletionChecker(num_datasets=search_criteria["num_results"])
+
         # Initialize chat
         print("\nInitializing chat...")
         message = society.init_chat()
         print(f"Initial message: {process_message(message)}")
+        reason = None
         
         # Process steps
         while True:
@@ -143,8 +149,22 @@ def main():
             # Check for completion
             if hasattr(response, 'terminated') and response.terminated:
                 break
-        
-        print("\nSearch completed successfully!")
+
+            # Stop once the task fields are filled or the run stalls
+            reason = checker.update(response)
+            if reason:
+                print(f"\nStopping early: {reason}")
+                break
+
+        for dataset in checker.datasets:
+            print(f"\n- {dataset['title']} ({dataset['id']}): {dataset['url']}")
+
+        if checker.complete:
+            print("\nSearch completed successfully!")
+        else:
+            found = len(checker.datasets)
+            print(f"\nSearch incomplete ({found}/{checker.num_datasets} datasets): "
+                  f"{reason or 'society ended before all fields were collected'}")
         
     except Exception as e:
         print(f"\nError during execution: {e}")
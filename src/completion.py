@@ -0,0 +1,351 @@
+# src/completion.py
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+PORTAL_URL = "https://cryoetdataportal.czscience.com"
+
+# Start of a reported result: "1. **Title** (DS-1)", "**Result 1:**", "### Dataset 1: Title"
+RESULT_START = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]*)?(?:"
+    r"\d+[.)][ \t]+(?:\*\*)?(?:(?:Result|Dataset)[ \t]+\d+[ \t]*[:.)]?)?"
+    r"|(?:\*\*)?(?:Result|Dataset)[ \t]+\d+[ \t]*[:.)]"
+    r")",
+    re.IGNORECASE | re.MULTILINE,
+)
+TITLE_PATTERN = re.compile(r"\b(?:Title|Name)\b\*{0,2}\s*:\s*\*{0,2}\s*(.+)", re.IGNORECASE)
+URL_PATTERN = re.compile(r"https?://cryoetdataportal\.czscience\.com/datasets/(\d+)")
+# IDs and URLs only count when labelled, so links in step narration are ignored
+ID_PATTERN = re.compile(
+    r"(?:\bDataset\s+ID|^[\s*-]*ID)\*{0,2}\s*:\s*\*{0,2}\s*(?:DS-)?(\d+)", re.IGNORECASE | re.MULTILINE
+)
+LABELLED_URL_PATTERN = re.compile(
+    r"\b(?:URL|Link)\*{0,2}\s*:\s*\*{0,2}\s*<?(" + URL_PATTERN.pattern + ")", re.IGNORECASE
+)
+METADATA_PATTERN = re.compile(
+    r"\b(?:Metadata[^:\n]*|Authors?|Organism)\*{0,2}\s*:\s*\*{0,2}\s*(.+)", re.IGNORECASE
+)
+LINK_PATTERN = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+BOLD_PATTERN = re.compile(r"\*\*([^*]+)\*\*")
+# "Title - DS-1 - https://... - Authors: A" and "**Title** (DS-1)" split into fields
+HEADER_DELIMITER = re.compile(r"\s+[-–—|]\s+|\s*[()]\s*")
+TITLE_END = re.compile(r"\s+[-–—|]\s+|\(|\bDS-\d+|https?://")
+
+# Values an agent writes when it could not actually read a field
+PLACEHOLDER_PATTERN = re.compile(
+    r"^(?:n/?a|none|null|unknown|tbd|-+|—|\?+|"
+    r"not (?:available|found|visible|provided|extracted|shown|listed|specified)\b.*)$",
+    re.IGNORECASE,
+)
+PLACEHOLDER_PHRASES = ("could not be extracted", "not extracted", "not directly visible", "unable to")
+PAGE_TITLES = ("cryoet data portal", "browse data")
+
+
+def is_placeholder(value: Optional[str], field: str = "") -> bool:
+    """Check whether a parsed field value is missing or a stand-in for one."""
+    text = (value or "").strip(" *_.\\").lower()
+    if not text or PLACEHOLDER_PATTERN.match(text):
+        return True
+    if any(phrase in text for phrase in PLACEHOLDER_PHRASES):
+        return True
+    return field == "title" and any(page in text for page in PAGE_TITLES)
+
+
+class CompletionChecker:
+    """Decide when a CryoET search society has finished its task.
+
+    Every response from ``society.step`` is fed to :meth:`update`, which
+    collects the dataset fields reported in assistant messages and tool
+    results, watches the Researcher's instructions for cycles and enforces
+    a step and time budget. ``update`` returns the reason to stop, or
+    ``None`` to keep going.
+
+    An instruction sequence counts as a cycle when, once results have been
+    reported, an instruction comes back with no new dataset fields since
+    its last occurrence or the opening instruction is reissued; when a
+    window of distinct instructions repeats back to back without new
+    fields; or when an instruction is issued more than ``max_repeats``
+    times.
+    """
+
+    def __init__(
+        self,
+        num_datasets: int = 5,
+        required_fields: Sequence[str] = ("title", "id", "url", "metadata"),
+        max_steps: int = 20,
+        max_seconds: float = 900.0,
+        max_repeats: int = 3,
+        max_window: int = 4,
+    ):
+        self.num_datasets = num_datasets
+        self.required_fields = tuple(required_fields)
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.max_repeats = max_repeats
+        self.max_window = max_window
+
+        self.steps = 0
+        self.started_at = time.monotonic()
+        self.records: Dict[str, Dict[str, str]] = {}
+        self.history: List[str] = []
+        self.history_progress: List[int] = []
+        self.last_progress: Dict[str, int] = {}
+
+    @property
+    def datasets(self) -> List[Dict[str, str]]:
+        """Datasets that have every required field filled."""
+        complete = [
+            record for record in self.records.values()
+            if all(record.get(field) for field in self.required_fields)
+        ]
+        return complete[:self.num_datasets]
+
+    @property
+    def complete(self) -> bool:
+        """Whether the requested number of datasets has been collected."""
+        return len(self.datasets) >= self.num_datasets
+
+    @property
+    def progress(self) -> int:
+        """Number of required fields filled across datasets identified so far."""
+        return sum(
+            1 for record in self.records.values() if record.get("id")
+            for field in self.required_fields if record.get(field)
+        )
+
+    def update(self, response: Any) -> Optional[str]:
+        """
+        Record a society response and check whether the run should stop.
+
+        Args:
+            response (Any): Value returned by ``society.step``
+
+        Returns:
+            Optional[str]: Reason for stopping, or None to continue
+        """
+        self.steps += 1
+        cycle = None
+
+        for text, is_instruction in self._iter_texts(response):
+            if is_instruction:
+                cycle = self._track_instruction(text) or cycle
+            else:
+                self._collect(text)
+
+        if self.complete:
+            return f"collected all fields for {self.num_datasets} datasets"
+        if cycle:
+            return cycle
+        if self.steps >= self.max_steps:
+            return f"step budget of {self.max_steps} exhausted"
+        if time.monotonic() - self.started_at >= self.max_seconds:
+            return f"time budget of {self.max_seconds:.0f}s exhausted"
+        return None
+
+    def _track_instruction(self, text: str) -> Optional[str]:
+        """Record an instruction and describe the cycle it closes, if any."""
+        key = self._normalize(text)
+        label = text.strip().splitlines()[0] if text.strip() else key
+        progress = self.progress
+        previous = self.last_progress.get(key)
+        follows_itself = bool(self.history) and self.history[-1] == key
+
+        self.history.append(key)
+        self.history_progress.append(progress)
+        self.last_progress[key] = progress
+
+        # Before any results, navigation legitimately repeats "continue"-style
+        # instructions, so stalls there are left to max_repeats
+        if previous is not None and 0 < progress <= previous:
+            return f"instruction repeated without new results: {label}"
+        if previous is not None and key == self.history[0] and not follows_itself and progress > 0:
+            return f"task restarted after results were reported: {label}"
+        for window in range(2, self.max_window + 1):
+            if len(self.history) < 2 * window:
+                break
+            tail = self.history[-window:]
+            if (
+                len(set(tail)) > 1
+                and tail == self.history[-2 * window:-window]
+                and self.history_progress[-2 * window] == progress
+            ):
+                return f"instruction cycle of length {window}: {label}"
+        if self.history.count(key) > self.max_repeats:
+            return f"instruction repeated {self.max_repeats + 1} times: {label}"
+        return None
+
+    def _iter_texts(self, response: Any):
+        """Yield (text, is_instruction) pairs from a step response."""
+        if response is None:
+            return
+        if isinstance(response, str):
+            yield response, response.lstrip().startswith("Instruction:")
+        elif isinstance(response, (tuple, list)):
+            for item in response:
+                yield from self._iter_texts(item)
+        elif hasattr(response, 'msgs'):
+            for msg in response.msgs or []:
+                yield from self._iter_texts(msg)
+            info = getattr(response, 'info', None) or {}
+            for record in info.get('tool_calls') or []:
+                result = getattr(record, 'result', None)
+                if result is not None:
+                    yield (result if isinstance(result, str) else json.dumps(result, default=str)), False
+        elif hasattr(response, 'content'):
+            content = response.content or ""
+            role_type = getattr(getattr(response, 'role_type', None), 'value', None)
+            yield content, role_type == "user" or content.lstrip().startswith("Instruction:")
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """Normalize an instruction so rephrased whitespace/punctuation still matches."""
+        text = re.sub(r"^\s*Instruction:\s*", "", text, flags=re.IGNORECASE)
+        return " ".join(re.sub(r"[^\w\s/:.-]", " ", text.lower()).split())
+
+    def _collect(self, text: str):
+        """Parse dataset fields out of an assistant message or tool result."""
+        for payload in self._iter_json(text):
+            datasets = payload.get("datasets")
+            if not isinstance(datasets, list):
+                dataset = payload.get("dataset")
+                datasets = dataset if isinstance(dataset, list) else [dataset]
+            for dataset in filter(lambda item: isinstance(item, dict), datasets):
+                dataset_id = str(dataset.get("id") or "")
+                metadata = {
+                    key: value for key, value in dataset.items()
+                    if key not in ("id", "name", "title", "description", "url") and value
+                }
+                self._merge({
+                    "title": dataset.get("title") or dataset.get("name"),
+                    "id": dataset_id,
+                    "url": dataset.get("url") or (f"{PORTAL_URL}/datasets/{dataset_id}" if dataset_id else None),
+                    "metadata": json.dumps(metadata, default=str) if metadata else None,
+                })
+
+        text = text.replace("\\n", "\n")
+        self._collect_tables(text)
+
+        starts = list(RESULT_START.finditer(text))
+        for match, following in zip(starts, starts[1:] + [None]):
+            block = text[match.end():following.start() if following else len(text)]
+            header, _, body = block.partition("\n")
+            self._merge(self._parse_block(header, body))
+
+    def _parse_block(self, header: str, body: str) -> Dict[str, Optional[str]]:
+        """Parse one numbered/headed result into dataset fields."""
+        fields = {}
+        block = f"{header}\n{body}"
+        link = LINK_PATTERN.search(header)
+        segments = [segment.strip(" *<>") for segment in HEADER_DELIMITER.split(LINK_PATTERN.sub(r"\1", header))]
+
+        title = TITLE_PATTERN.search(block)
+        header_title = self._header_title(header)
+        fields["title"] = title.group(1) if title else header_title
+        if header_title is None:
+            # Narration header: its links and IDs are not result fields
+            link, segments = None, []
+
+        url = LABELLED_URL_PATTERN.search(block)
+        if url:
+            fields["url"] = url.group(1)
+        elif link and URL_PATTERN.fullmatch(link.group(2)):
+            fields["url"] = link.group(2)
+        else:
+            fields["url"] = next((segment for segment in segments if URL_PATTERN.fullmatch(segment)), None)
+
+        dataset_id = ID_PATTERN.search(block)
+        standalone = next((segment for segment in segments if re.fullmatch(r"DS-\d+", segment)), None)
+        if dataset_id:
+            fields["id"] = dataset_id.group(1)
+        elif standalone:
+            fields["id"] = standalone[3:]
+        elif fields["url"]:
+            fields["id"] = URL_PATTERN.match(fields["url"]).group(1)
+
+        metadata = METADATA_PATTERN.search(block)
+        if metadata:
+            fields["metadata"] = metadata.group(1)
+        return fields
+
+    @staticmethod
+    def _header_title(header: str) -> Optional[str]:
+        """Take a title from a bold or linked span, or the text before the first field delimiter."""
+        span = BOLD_PATTERN.search(header) or LINK_PATTERN.search(header)
+        if span:
+            return span.group(1)
+        end = TITLE_END.search(header)
+        if end is None:
+            return header
+        if end.group(0).startswith(("DS-", "http")):
+            # A bare ID or link inside prose is narration, not a result
+            return None
+        return header[:end.start()]
+
+    def _collect_tables(self, text: str):
+        """Parse markdown tables whose header names the dataset fields."""
+        lines = text.splitlines()
+        for index, line in enumerate(lines[:-1]):
+            if not line.strip().startswith("|") or not re.match(r"^\s*\|?[\s:|-]+\|?\s*$", lines[index + 1]):
+                continue
+            columns = [cell.strip(" *").lower() for cell in line.strip().strip("|").split("|")]
+            for row in lines[index + 2:]:
+                if not row.strip().startswith("|"):
+                    break
+                cells = [cell.strip() for cell in row.strip().strip("|").split("|")]
+                self._merge(self._parse_row(dict(zip(columns, cells)), row))
+
+    def _parse_row(self, row: Dict[str, str], raw: str) -> Dict[str, Optional[str]]:
+        """Map a table row onto dataset fields by column name."""
+        fields = {}
+        metadata = []
+        for column, cell in row.items():
+            value = LINK_PATTERN.sub(r"\1", cell).strip(" *")
+            if column in ("#", "no", "no.", "rank", ""):
+                continue
+            if "id" in column.split() or column == "id":
+                digits = re.search(r"\d+", value)
+                fields["id"] = digits.group(0) if digits else None
+            elif column in ("title", "name", "dataset", "dataset title", "dataset name"):
+                fields["title"] = value
+            elif column in ("url", "link", "dataset url"):
+                fields["url"] = value
+            elif not is_placeholder(value):
+                metadata.append(f"{column}: {value}")
+        url = URL_PATTERN.search(raw)
+        if url:
+            fields["url"] = url.group(0)
+            fields["id"] = fields.get("id") or url.group(1)
+        elif fields.get("url") and not URL_PATTERN.match(fields["url"]):
+            fields["url"] = None
+        fields["metadata"] = ", ".join(metadata) or None
+        return fields
+
+    @staticmethod
+    def _iter_json(text: str):
+        """Yield JSON objects embedded in a tool result."""
+        decoder = json.JSONDecoder()
+        index = text.find("{")
+        while index != -1:
+            try:
+                payload, end = decoder.raw_decode(text, index)
+            except ValueError:
+                index = text.find("{", index + 1)
+                continue
+            if isinstance(payload, dict):
+                yield payload
+            index = text.find("{", end)
+
+    def _merge(self, fields: Dict[str, Optional[str]]):
+        """Merge fields into the record for the same dataset."""
+        fields = {
+            key: value.strip(" *:-\\") for key, value in fields.items()
+            if isinstance(value, str) and not is_placeholder(value, key)
+        }
+        key = fields.get("id") or fields.get("title")
+        if not key:
+            return
+        if "id" in fields and fields.get("title") in self.records:
+            # Earlier report without an ID is the same dataset
+            self.records[key] = self.records.pop(fields["title"])
+        self.records.setdefault(key, {}).update(fields)
@@ -0,0 +1,444 @@
+# src/toolkits/tomogram_stats.py
+"""
+Per-tomogram statistics over downloaded MRC volumes.
+
+Volumes are memory-mapped and split into slabs of z-slices that are
+processed by a process pool. Each worker reads one slice at a time, so
+peak memory per worker stays at a single slice regardless of volume size.
+Partial results are merged exactly: moments with Chan's parallel update
+and histograms by summing counts over shared bin edges. NaN/inf voxels are
+excluded and counted. A file that cannot be read gets an "error" entry
+without stopping the others.
+
+Each uncached volume is read twice. The first pass hashes every slice and
+computes moments, which gives the checksum used as the cache key and the
+value range. The second pass histograms over bin edges fixed by that
+range, so slabs of one volume share edges and their counts add exactly.
+A volume's second pass starts as soon as its own first pass is done. A
+cached volume still costs the first read, since the checksum covers its
+voxel data.
+
+Usage:
+    python -m src.toolkits.tomogram_stats results/ --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# MRC2014 data modes supported for statistics
+MRC_MODES = {
+    0: np.int8,
+    1: np.int16,
+    2: np.float32,
+    6: np.uint16,
+    12: np.float16,
+}
+MRC_HEADER_SIZE = 1024
+
+SLAB_SIZE = 16
+HISTOGRAM_BINS = 1024
+CONTRAST_PERCENTILES = (1.0, 99.0)
+EMPTY_STD_FRACTION = 0.05
+CACHE_VERSION = 3
+
+
+def read_mrc_header(path: str) -> Tuple[Tuple[int, int, int], np.dtype, int]:
+    """
+    Read the shape, dtype and data offset of an MRC file.
+
+    Args:
+        path (str): Path to the MRC file
+
+    Returns:
+        Tuple[Tuple[int, int, int], np.dtype, int]: (nz, ny, nx), dtype, data offset
+    """
+    with open(path, "rb") as f:
+        header = f.read(MRC_HEADER_SIZE)
+    if len(header) < MRC_HEADER_SIZE:
+        raise ValueError(f"{path} is too small to be an MRC file")
+
+    # Machine stamp 0x11 marks big-endian data, anything else little-endian
+    byteorder = ">" if header[212] == 0x11 else "<"
+    nx, ny, nz, mode = np.frombuffer(header, dtype=f"{byteorder}i4", count=4)
+    nsymbt = int(np.frombuffer(header, dtype=f"{byteorder}i4", count=1, offset=92)[0])
+
+    if int(mode) not in MRC_MODES:
+        raise ValueError(f"Unsupported MRC mode {mode} in {path}")
+    dtype = np.dtype(MRC_MODES[int(mode)]).newbyteorder(byteorder)
+    shape = (int(nz), int(ny), int(nx))
+    offset = MRC_HEADER_SIZE + nsymbt
+
+    expected = offset + int(np.prod(shape)) * dtype.itemsize
+    if os.path.getsize(path) < expected:
+        raise ValueError(f"{path} is truncated: expected {expected} bytes, found {os.path.getsize(path)}")
+    return shape, dtype, offset
+
+
+def open_volume(path: str) -> np.memmap:
+    """Memory-map the voxel data of an MRC file without loading it."""
+    shape, dtype, offset = read_mrc_header(path)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+
+def volume_checksum(path: str, offset: int, slice_digests: Sequence[bytes]) -> str:
+    """
+    Combine the header bytes and per-slice SHA-256 digests into a volume checksum.
+
+    Slices are hashed by the workers that already read them for moments, so
+    the checksum costs no extra pass over the voxel data.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        digest.update(f.read(offset))
+    for slice_digest in slice_digests:
+        digest.update(slice_digest)
+    return digest.hexdigest()
+
+
+def merge_moments(a: Dict[str, float], b: Dict[str, float]) -> Dict[str, float]:
+    """
+    Merge two partial (count, mean, m2, min, max, nonfinite) summaries exactly.
+
+    Uses Chan et al.'s parallel update so slabs can be combined in any order.
+    Moments cover finite voxels only; NaN/inf voxels are counted separately.
+    """
+    nonfinite = a["nonfinite"] + b["nonfinite"]
+    if a["count"] == 0:
+        return dict(b, nonfinite=nonfinite)
+    if b["count"] == 0:
+        return dict(a, nonfinite=nonfinite)
+    count = a["count"] + b["count"]
+    delta = b["mean"] - a["mean"]
+    return {
+        "count": count,
+        "mean": a["mean"] + delta * b["count"] / count,
+        "m2": a["m2"] + b["m2"] + delta * delta * a["count"] * b["count"] / count,
+        "min": min(a["min"], b["min"]),
+        "max": max(a["max"], b["max"]),
+        "nonfinite": nonfinite,
+    }
+
+
+def empty_moments() -> Dict[str, float]:
+    """Identity element for merge_moments."""
+    return {"count": 0, "mean": 0.0, "m2": 0.0, "min": np.inf, "max": -np.inf, "nonfinite": 0}
+
+
+def finite_voxels(data: np.ndarray) -> np.ndarray:
+    """Flatten a slice to its finite voxels."""
+    if data.dtype.kind in "iu":
+        return data.ravel()
+    return data[np.isfinite(data)]
+
+
+def slab_moments(path: str, start: int, stop: int) -> Dict[str, Any]:
+    """
+    Compute moments and slice digests for slices [start, stop) of a volume.
+
+    Returns the merged slab summary, the SHA-256 digest of each slice and
+    each slice's std, which is used for empty-slab detection. A slice with
+    no finite voxels has std 0.
+    """
+    volume = open_volume(path)
+    total = empty_moments()
+    slice_digests, slice_stds = [], []
+    for z in range(start, stop):
+        raw = np.asarray(volume[z])
+        slice_digests.append(hashlib.sha256(raw).digest())
+        data = finite_voxels(raw).astype(np.float64)
+        part = empty_moments()
+        part["nonfinite"] = raw.size - data.size
+        if data.size:
+            mean = float(data.mean())
+            part.update(
+                count=data.size,
+                mean=mean,
+                m2=float(np.square(data - mean).sum()),
+                min=float(data.min()),
+                max=float(data.max()),
+            )
+        total = merge_moments(total, part)
+        slice_stds.append(float(np.sqrt(part["m2"] / data.size)) if data.size else 0.0)
+    del volume
+    return {"moments": total, "slice_digests": slice_digests, "slice_stds": slice_stds}
+
+
+def slab_histogram(path: str, start: int, stop: int, bins: int, value_range: Tuple[float, float]) -> np.ndarray:
+    """Histogram slices [start, stop) of a volume over shared bin edges."""
+    volume = open_volume(path)
+    counts = np.zeros(bins, dtype=np.int64)
+    for z in range(start, stop):
+        counts += np.histogram(finite_voxels(np.asarray(volume[z])), bins=bins, range=value_range)[0]
+    del volume
+    return counts
+
+
+def histogram_percentiles(counts: np.ndarray, edges: np.ndarray, percentiles: Sequence[float]) -> List[float]:
+    """Estimate percentiles from a histogram, interpolating within bins."""
+    cumulative = np.concatenate([[0], np.cumsum(counts)])
+    targets = np.asarray(percentiles, dtype=np.float64) / 100.0 * cumulative[-1]
+    return [float(value) for value in np.interp(targets, cumulative, edges)]
+
+
+def empty_slabs(slice_stds: Sequence[float], threshold: float) -> List[List[int]]:
+    """Group consecutive slices whose std falls below threshold into [start, stop) ranges."""
+    ranges = []
+    start = None
+    for z, std in enumerate(slice_stds):
+        if std <= threshold and start is None:
+            start = z
+        elif std > threshold and start is not None:
+            ranges.append([start, z])
+            start = None
+    if start is not None:
+        ranges.append([start, len(slice_stds)])
+    return ranges
+
+
+class TomogramStatistics:
+    """Compute per-volume statistics over a directory of MRC files.
+
+    Args:
+        workers (Optional[int]): Size of the process pool, defaults to CPU count
+        slab_size (int): Number of z-slices per work unit
+        bins (int): Number of histogram bins
+        percentiles (Sequence[float]): Lower/upper percentiles for contrast limits
+        empty_fraction (float): Slices with std below this fraction of the
+            volume std are reported as empty
+        cache_dir (Optional[Path]): Where per-checksum results are stored
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        slab_size: int = SLAB_SIZE,
+        bins: int = HISTOGRAM_BINS,
+        percentiles: Sequence[float] = CONTRAST_PERCENTILES,
+        empty_fraction: float = EMPTY_STD_FRACTION,
+        cache_dir: Optional[Path] = None,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.slab_size = slab_size
+        self.bins = bins
+        self.percentiles = tuple(percentiles)
+        self.empty_fraction = empty_fraction
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+    def _cache_path(self, checksum: str) -> Optional[Path]:
+        """Cache file for a checksum, keyed on the parameters that affect results."""
+        if self.cache_dir is None:
+            return None
+        params = json.dumps([CACHE_VERSION, self.bins, self.percentiles, self.empty_fraction])
+        key = hashlib.sha256(f"{checksum}:{params}".encode()).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def _slabs(self, path: str, nz: int) -> List[Tuple[str, int, int]]:
+        """Split a volume into (path, start, stop) work units."""
+        return [(path, z, min(z + self.slab_size, nz)) for z in range(0, nz, self.slab_size)]
+
+    def compute(self, paths: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Compute statistics for each volume, using cached results where possible.
+
+        Args:
+            paths (Sequence[str]): MRC files to process
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Statistics keyed by file path
+        """
+        paths = [str(path) for path in paths]
+        results, errors = {}, {}
+        headers, parts, checksums = {}, {}, {}
+        summaries, ranges = {}, {}
+        histogram_futures = {}
+
+        # A truncated or unsupported file is reported on its own entry
+        for path in paths:
+            try:
+                headers[path] = read_mrc_header(path)
+            except Exception as e:
+                errors[path] = str(e)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+
+            def finish_first_pass(path: str):
+                """Check the cache for a volume and queue its histogram pass."""
+                shape, dtype, offset = headers[path]
+                ordered = [parts[path][start] for start in sorted(parts[path])]
+                digests = [digest for part in ordered for digest in part["slice_digests"]]
+                checksums[path] = volume_checksum(path, offset, digests)
+
+                cache_path = self._cache_path(checksums[path])
+                if cache_path is not None and cache_path.exists():
+                    results[path] = dict(json.loads(cache_path.read_text()), file=path)
+                    return
+
+                summary = empty_moments()
+                for part in ordered:
+                    summary = merge_moments(summary, part["moments"])
+                summaries[path] = (summary, [std for part in ordered for std in part["slice_stds"]])
+                if summary["count"] == 0:
+                    return
+                low, high = summary["min"], summary["max"]
+                ranges[path] = (low, high if high > low else low + 1.0)
+                histogram_futures[path] = [
+                    pool.submit(slab_histogram, path, start, stop, self.bins, ranges[path])
+                    for _, start, stop in self._slabs(path, shape[0])
+                ]
+
+            # Pass 1: checksum and moments in a single read of each slab
+            moment_futures = {}
+            remaining = {}
+            for path, (shape, _, _) in headers.items():
+                parts[path] = {}
+                units = self._slabs(path, shape[0])
+                remaining[path] = len(units)
+                for unit in units:
+                    moment_futures[pool.submit(slab_moments, *unit)] = unit
+                if not units:
+                    finish_first_pass(path)
+
+            # Pass 2 for a volume is queued as soon as its own slabs are in
+            while moment_futures:
+                done, _ = wait(moment_futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, start, _ = moment_futures.pop(future)
+                    if path in errors:
+                        continue
+                    try:
+                        parts[path][start] = future.result()
+                    except Exception as e:
+                        errors[path] = str(e)
+                        continue
+                    remaining[path] -= 1
+                    if remaining[path] == 0:
+                        finish_first_pass(path)
+
+            histograms = {}
+            for path, futures in histogram_futures.items():
+                try:
+                    histograms[path] = sum(future.result() for future in futures)
+                except Exception as e:
+                    errors[path] = str(e)
+
+        for path, (shape, dtype, _) in headers.items():
+            if path in errors or path in results:
+                continue
+            summary, slice_stds = summaries[path]
+            stats = self._summarize(path, checksums[path], shape, dtype, summary,
+                                    slice_stds, histograms.get(path), ranges.get(path))
+            cache_path = self._cache_path(checksums[path])
+            if cache_path is not None:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                cache_path.write_text(json.dumps(stats, allow_nan=False))
+            results[path] = stats
+
+        for path, message in errors.items():
+            results[path] = {"file": path, "error": message}
+
+        return {path: results[path] for path in paths}
+
+    def _summarize(
+        self,
+        path: str,
+        checksum: str,
+        shape: Tuple[int, int, int],
+        dtype: np.dtype,
+        summary: Dict[str, float],
+        slice_stds: List[float],
+        counts: Optional[np.ndarray],
+        value_range: Optional[Tuple[float, float]],
+    ) -> Dict[str, Any]:
+        """Turn merged partial results into the per-volume report."""
+        stats = {
+            "file": path,
+            "checksum": checksum,
+            "shape": list(shape),
+            "dtype": dtype.name,
+            "nonfinite_voxels": summary["nonfinite"],
+            "mean": None,
+            "std": None,
+            "min": None,
+            "max": None,
+            "contrast_limits": {"percentiles": list(self.percentiles), "low": None, "high": None},
+            "empty_slabs": empty_slabs(slice_stds, 0.0),
+            "histogram": None,
+        }
+        if summary["count"] == 0:
+            return stats
+
+        std = float(np.sqrt(summary["m2"] / summary["count"]))
+        edges = np.linspace(*value_range, self.bins + 1)
+        if summary["max"] > summary["min"]:
+            low, high = histogram_percentiles(counts, edges, self.percentiles)
+        else:
+            # Constant volume: every percentile is the value itself
+            low = high = summary["min"]
+        stats.update(
+            mean=summary["mean"],
+            std=std,
+            min=summary["min"],
+            max=summary["max"],
+            empty_slabs=empty_slabs(slice_stds, self.empty_fraction * std),
+            histogram={"edges": edges.tolist(), "counts": counts.tolist()},
+        )
+        stats["contrast_limits"].update(low=low, high=high)
+        return stats
+
+    def compute_directory(self, directory: str, pattern: str = "*.mrc") -> Dict[str, Dict[str, Any]]:
+        """Compute statistics for every volume in a directory matching pattern."""
+        return self.compute(sorted(Path(directory).glob(pattern)))
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Compute per-tomogram statistics over MRC volumes.")
+    parser.add_argument("directory", nargs="?", default="./results", help="Directory of MRC volumes")
+    parser.add_argument("--pattern", default="tomogram_*.mrc", help="Glob for volumes in the directory")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--slab-size", type=int, default=SLAB_SIZE, help="Z-slices per work unit")
+    parser.add_argument("--bins", type=int, default=HISTOGRAM_BINS, help="Histogram bins")
+    parser.add_argument("--percentiles", type=float, nargs=2, default=CONTRAST_PERCENTILES,
+                        help="Lower and upper percentiles for contrast limits")
+    parser.add_argument("--empty-fraction", type=float, default=EMPTY_STD_FRACTION,
+                        help="Slice std fraction below which a slice counts as empty")
+    parser.add_argument("--cache-dir", default=None, help="Cache directory (default: <directory>/.stats_cache)")
+    parser.add_argument("--output", default=None, help="Write full results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    engine = TomogramStatistics(
+        workers=args.workers,
+        slab_size=args.slab_size,
+        bins=args.bins,
+        percentiles=args.percentiles,
+        empty_fraction=args.empty_fraction,
+        cache_dir=args.cache_dir or Path(args.directory) / ".stats_cache",
+    )
+    results = engine.compute_directory(args.directory, args.pattern)
+
+    for path, stats in results.items():
+        if "error" in stats:
+            print(f"{path}: error: {stats['error']}")
+        elif stats["mean"] is None:
+            print(f"{path}: shape={stats['shape']} no finite voxels")
+        else:
+            limits = stats["contrast_limits"]
+            print(
+                f"{path}: shape={stats['shape']} mean={stats['mean']:.4g} std={stats['std']:.4g} "
+                f"contrast=[{limits['low']:.4g}, {limits['high']:.4g}] empty_slabs={stats['empty_slabs']} "
+                f"nonfinite={stats['nonfinite_voxels']}"
+            )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, allow_nan=False))
+        print(f"\nWrote statistics for {len(results)} volumes to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
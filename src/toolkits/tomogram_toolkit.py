@@ -4,6 +4,8 @@ from camel.toolkits import BaseToolkit
 from typing import List, Dict, Any
 import cryoet_data_portal as portal
 from pathlib import Path
+import json
+from .tomogram_stats import TomogramStatistics
 
 class TomogramToolkit(BaseToolkit):
     """Toolkit for CryoET data portal interactions"""
@@ -151,11 +153,53 @@ class TomogramToolkit(BaseToolkit):
                 "message": str(e)
             }
 
+    def compute_tomogram_statistics(self, directory: str = None, workers: int = None) -> Dict[str, Any]:
+        """
+        Compute intensity statistics for downloaded tomograms.
+        
+        Args:
+            directory (str): Directory of MRC volumes, defaults to the results directory
+            workers (int): Number of worker processes, defaults to the CPU count
+            
+        Returns:
+            Dict[str, Any]: Mean, std, contrast limits and empty slabs per tomogram;
+                unreadable files get an "error" entry
+        """
+        try:
+            directory = Path(directory) if directory else self.output_dir
+            engine = TomogramStatistics(workers=workers, cache_dir=directory / ".stats_cache")
+            results = engine.compute_directory(str(directory), "tomogram_*.mrc")
+            
+            # Full histograms go next to the volumes, the summary is returned
+            report_path = directory / "tomogram_stats.json"
+            report_path.write_text(json.dumps(results, indent=2, allow_nan=False))
+            
+            summaries = []
+            for stats in results.values():
+                summaries.append({
+                    key: value for key, value in stats.items() if key != "histogram"
+                })
+            
+            return {
+                "status": "success",
+                "count": len(summaries),
+                "errors": sum(1 for stats in summaries if "error" in stats),
+                "tomograms": summaries,
+                "file_path": str(report_path)
+            }
+            
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+
     def get_tools(self) -> List[callable]:
         """Get all tools in the toolkit"""
         return [
             self.search_datasets,
             self.get_dataset_details,
-            self.download_tomogram
+            self.download_tomogram,
+            self.compute_tomogram_statistics
         ]
 
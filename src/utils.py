@@ -1,11 +1,20 @@
 # src/utils.py
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional
 from camel.societies import RolePlaying
 from camel.messages import BaseMessage
+from src.completion import CompletionChecker
 
 
-def run_society(society: RolePlaying) -> Tuple[str, List, int]:
-    """Run the society and process results."""
+def run_society(
+    society: RolePlaying,
+    checker: Optional[CompletionChecker] = None
+) -> Tuple[str, List, int]:
+    """Run the society and process results.
+
+    The loop ends when the model terminates or, if a ``checker`` is given,
+    when it reports that the task fields are filled, instructions cycle,
+    or the step/time budget is spent.
+    """
     try:
         # Initialize chat
         messages = []
@@ -37,6 +46,12 @@ def run_society(society: RolePlaying) -> Tuple[str, List, int]:
             # Check for completion
             if hasattr(response, 'terminated') and response.terminated:
                 break
+
+            # Stop once the task fields are filled or the run stalls
+            reason = checker.update(response) if checker else None
+            if reason:
+                print(f"\nStopping early: {reason}")
+                break
         
         # Get final answer
         final_answer = messages[-1].content if messages else "No response generated"
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+# Make the src package importable when running pytest from any directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,171 @@
+# tests/test_completion.py
+import json
+from pathlib import Path
+from types import SimpleNamespace
+
+from src.completion import CompletionChecker
+
+RESULTS_MD = Path(__file__).resolve().parent.parent / "results.md"
+URL = "https://cryoetdataportal.czscience.com/datasets"
+
+
+def step(content: str = "", instruction: str = None, tool_results=()):
+    """Build a (assistant, user) pair shaped like RolePlaying.step output."""
+    assistant = SimpleNamespace(
+        msgs=[SimpleNamespace(content=content, role_type=SimpleNamespace(value="assistant"))],
+        info={"tool_calls": [SimpleNamespace(result=result) for result in tool_results]},
+    )
+    user = SimpleNamespace(
+        msgs=[SimpleNamespace(content=instruction, role_type=SimpleNamespace(value="user"))] if instruction else [],
+        info={},
+    )
+    return assistant, user
+
+
+def test_results_transcript_collects_reported_datasets():
+    checker = CompletionChecker(num_datasets=3, required_fields=("title", "id", "metadata"))
+    assert checker.update(RESULTS_MD.read_text()) == "collected all fields for 3 datasets"
+    assert [dataset["id"] for dataset in checker.datasets] == ["10227", "10228", "10229"]
+    assert checker.datasets[1]["title"] == "Salmonella fliL knockout minicells"
+
+
+def test_results_transcript_rejects_placeholder_urls():
+    checker = CompletionChecker(num_datasets=3)
+    checker.update(RESULTS_MD.read_text())
+    assert not checker.complete
+    assert all("url" not in record for record in checker.records.values())
+
+
+def test_numbered_bold_format():
+    checker = CompletionChecker(num_datasets=2)
+    reason = checker.update(
+        f"1. **Salmonella fliHIJ knockout minicells** (DS-10227)\n"
+        f"   - Authors: Morgan Beeby, Grant Jensen\n"
+        f"   - URL: {URL}/10227\n"
+        f"2. **Salmonella fliL knockout minicells** (DS-10228)\n"
+        f"   - Authors: Morgan Beeby\n"
+        f"   - URL: {URL}/10228\n"
+    )
+    assert reason == "collected all fields for 2 datasets"
+    assert checker.datasets[0]["title"] == "Salmonella fliHIJ knockout minicells"
+
+
+def test_markdown_table_format():
+    checker = CompletionChecker(num_datasets=2)
+    checker.update(
+        "| # | Title | ID | URL | Authors |\n"
+        "|---|-------|----|-----|---------|\n"
+        f"| 1 | [Salmonella A]({URL}/10227) | DS-10227 | {URL}/10227 | Beeby |\n"
+        f"| 2 | Salmonella B | DS-10228 | {URL}/10228 | Jensen |\n"
+    )
+    assert checker.complete
+    assert [dataset["title"] for dataset in checker.datasets] == ["Salmonella A", "Salmonella B"]
+
+
+def test_heading_format():
+    checker = CompletionChecker(num_datasets=1)
+    checker.update(f"### Dataset 1: Salmonella A\n- **Dataset ID:** DS-10227\n- **URL:** {URL}/10227\n- **Authors:** Beeby\n")
+    assert checker.datasets == [{"title": "Salmonella A", "id": "10227", "url": f"{URL}/10227", "metadata": "Beeby"}]
+
+
+def test_inline_dash_format():
+    checker = CompletionChecker(num_datasets=1)
+    checker.update(f"1. Salmonella A - DS-10227 - {URL}/10227 - Authors: Beeby\n")
+    assert checker.datasets == [{"title": "Salmonella A", "id": "10227", "url": f"{URL}/10227", "metadata": "Beeby"}]
+
+
+def test_numbered_step_narration_is_not_a_dataset():
+    checker = CompletionChecker(num_datasets=2)
+    reason = checker.update(
+        f"1. Navigated to {URL}/10227 and looked at Authors: someone\n"
+        f"2. Opened {URL}/10228 (DS-10228) and read Authors: someone else\n"
+    )
+    assert reason is None
+    assert checker.datasets == []
+    assert all("id" not in record and "url" not in record for record in checker.records.values())
+
+
+def test_placeholders_and_page_titles_are_not_fields():
+    checker = CompletionChecker(num_datasets=1, required_fields=("title", "metadata"))
+    assert checker.update("Dataset 1: loaded the page. Title: Browse Data | CryoET Data Portal\nAuthors: N/A") is None
+    assert checker.records == {}
+
+
+def test_json_tool_results():
+    checker = CompletionChecker(num_datasets=2)
+    payload = {"status": "success", "datasets": [
+        {"id": 10227, "name": "Salmonella A", "authors": ["Beeby"]},
+        {"id": 10228, "name": "Salmonella B", "authors": ["Jensen"]},
+    ]}
+    reason = checker.update(step("Searching...", tool_results=[f"prefix {{not json}} {json.dumps(payload)} done"]))
+    assert reason == "collected all fields for 2 datasets"
+    assert checker.datasets[1]["url"] == f"{URL}/10228"
+
+
+def test_json_non_list_datasets_is_ignored():
+    checker = CompletionChecker(num_datasets=1)
+    assert checker.update('{"datasets": 5}') is None
+    assert checker.update('{"datasets": {"id": 1}}') is None
+    assert checker.records == {}
+
+
+def test_json_dataset_list():
+    checker = CompletionChecker(num_datasets=2)
+    checker.update('{"dataset": [{"id": 1, "name": "a", "authors": ["x"]}, {"id": 2, "name": "b", "authors": ["y"]}]}')
+    assert [dataset["id"] for dataset in checker.datasets] == ["1", "2"]
+
+
+def test_json_after_other_objects():
+    checker = CompletionChecker(num_datasets=1)
+    checker.update('first {"a":1} then {"dataset":{"id":5,"name":"x","authors":["y"]}}')
+    assert checker.datasets[0]["id"] == "5"
+
+
+def test_continue_instruction_does_not_stop_before_results():
+    checker = CompletionChecker()
+    for _ in range(3):
+        assert checker.update(step("Working on it.", "Instruction: Continue with the next result.")) is None
+    assert "repeated 4 times" in checker.update(step("Working on it.", "Instruction: Continue with the next result."))
+
+
+def test_continue_instruction_with_progress_does_not_stop():
+    checker = CompletionChecker(max_repeats=10)
+    for index in range(1, 5):
+        report = f"1. **Dataset {index}** (DS-{index})\n   - Authors: A\n"
+        assert checker.update(step(report, "Instruction: Continue with the next result.")) is None
+
+
+def test_repeat_without_new_results_stops():
+    checker = CompletionChecker()
+    report = "1. **Salmonella A** (DS-10227)\n   - Authors: Beeby\n"
+    assert checker.update(step(report, "Instruction: Continue with the next result.")) is None
+    reason = checker.update(step(report, "Instruction: Continue with the next result."))
+    assert reason.startswith("instruction repeated without new results")
+
+
+def test_restart_after_results_stops():
+    checker = CompletionChecker()
+    navigate = "Instruction: Navigate to the specified URL.\nInput: https://cryoetdataportal.czscience.com/browse-data/datasets"
+    assert checker.update(step("", navigate)) is None
+    assert checker.update(step("Opened the page.", "Instruction: Search for salmonella and extract the results.")) is None
+    reason = checker.update(step(RESULTS_MD.read_text(), navigate))
+    assert reason.startswith("task restarted after results were reported")
+
+
+def test_instruction_window_cycle_stops():
+    checker = CompletionChecker()
+    instructions = ["Instruction: Click search.", "Instruction: Scroll down."] * 2
+    reasons = [checker.update(step("", instruction)) for instruction in instructions]
+    assert reasons[:3] == [None, None, None]
+    assert reasons[3].startswith("instruction cycle of length 2")
+
+
+def test_step_budget():
+    checker = CompletionChecker(max_steps=2)
+    assert checker.update(step("", "Instruction: Open the page.")) is None
+    assert checker.update(step("", "Instruction: Search.")) == "step budget of 2 exhausted"
+
+
+def test_time_budget():
+    checker = CompletionChecker(max_seconds=0)
+    assert checker.update(step("", "Instruction: Open the page.")) == "time budget of 0s exhausted"
@@ -0,0 +1,143 @@
+# tests/test_tomogram_stats.py
+import json
+
+import numpy as np
+import pytest
+
+from src.toolkits.tomogram_stats import TomogramStatistics, main, read_mrc_header
+
+
+def write_mrc(path, data: np.ndarray, mode: int, big_endian: bool = False):
+    """Write a minimal MRC2014 file with the given voxel data."""
+    order = ">" if big_endian else "<"
+    header = np.zeros(256, dtype=f"{order}i4")
+    header[0:3] = data.shape[::-1]
+    header[3] = mode
+    raw = bytearray(header.tobytes())
+    raw[208:212] = b"MAP "
+    raw[212:214] = b"\x11\x11" if big_endian else b"\x44\x44"
+    path.write_bytes(bytes(raw) + data.astype(data.dtype.newbyteorder(order)).tobytes())
+    return path
+
+
+@pytest.fixture
+def volumes(tmp_path):
+    rng = np.random.default_rng(0)
+    floats = rng.normal(5, 2, (40, 24, 20)).astype(np.float32)
+    floats[:5] = 1.0
+    floats[30:33] = 2.0
+    ints = rng.integers(-100, 100, (17, 16, 12)).astype(np.int16)
+    write_mrc(tmp_path / "tomogram_1.mrc", floats, 2)
+    write_mrc(tmp_path / "tomogram_2.mrc", ints, 1, big_endian=True)
+    return tmp_path, {"tomogram_1.mrc": floats, "tomogram_2.mrc": ints}
+
+
+def test_header_reads_big_endian(volumes):
+    directory, data = volumes
+    shape, dtype, offset = read_mrc_header(str(directory / "tomogram_2.mrc"))
+    assert shape == data["tomogram_2.mrc"].shape
+    assert dtype.byteorder == ">"
+    assert offset == 1024
+
+
+def test_moments_and_histogram_match_numpy(volumes):
+    directory, data = volumes
+    results = TomogramStatistics(workers=2, slab_size=4).compute_directory(str(directory))
+    for path, stats in results.items():
+        expected = data[path.split("/")[-1]].astype(np.float64)
+        assert stats["mean"] == pytest.approx(expected.mean(), abs=1e-9)
+        assert stats["std"] == pytest.approx(expected.std(), abs=1e-9)
+        assert stats["min"] == expected.min() and stats["max"] == expected.max()
+        assert sum(stats["histogram"]["counts"]) == expected.size
+        low, high = np.percentile(expected, [1, 99])
+        bin_width = (expected.max() - expected.min()) / 1024
+        assert stats["contrast_limits"]["low"] == pytest.approx(low, abs=2 * bin_width)
+        assert stats["contrast_limits"]["high"] == pytest.approx(high, abs=2 * bin_width)
+
+
+def test_slab_size_does_not_change_results(volumes):
+    directory, _ = volumes
+    small = TomogramStatistics(workers=2, slab_size=1).compute_directory(str(directory))
+    large = TomogramStatistics(workers=2, slab_size=64).compute_directory(str(directory))
+    for path in small:
+        assert small[path]["mean"] == pytest.approx(large[path]["mean"], abs=1e-12)
+        assert small[path]["std"] == pytest.approx(large[path]["std"], abs=1e-12)
+        assert small[path]["histogram"] == large[path]["histogram"]
+        assert small[path]["empty_slabs"] == large[path]["empty_slabs"]
+
+
+def test_empty_slabs(volumes):
+    directory, _ = volumes
+    results = TomogramStatistics(workers=1, slab_size=7).compute_directory(str(directory))
+    assert results[str(directory / "tomogram_1.mrc")]["empty_slabs"] == [[0, 5], [30, 33]]
+    assert results[str(directory / "tomogram_2.mrc")]["empty_slabs"] == []
+
+
+def test_cache_hit_round_trips(volumes, monkeypatch):
+    directory, _ = volumes
+    engine = TomogramStatistics(workers=1, cache_dir=directory / ".cache")
+    first = engine.compute_directory(str(directory))
+    assert len(list((directory / ".cache").glob("*.json"))) == 2
+
+    def fail(*args):
+        raise AssertionError("cached volume was recomputed")
+
+    monkeypatch.setattr(TomogramStatistics, "_summarize", fail)
+    assert engine.compute_directory(str(directory)) == first
+
+
+def test_cache_key_follows_voxel_data(volumes):
+    directory, data = volumes
+    engine = TomogramStatistics(workers=1, cache_dir=directory / ".cache")
+    path = str(directory / "tomogram_1.mrc")
+    before = engine.compute_directory(str(directory))[path]
+    resliced = TomogramStatistics(workers=1, slab_size=3, cache_dir=directory / ".cache")
+    assert resliced.compute_directory(str(directory))[path]["checksum"] == before["checksum"]
+
+    changed = data["tomogram_1.mrc"].copy()
+    changed[10, 0, 0] += 100.0
+    write_mrc(directory / "tomogram_1.mrc", changed, 2)
+    after = engine.compute_directory(str(directory))[path]
+    assert after["checksum"] != before["checksum"]
+    assert after["max"] == pytest.approx(float(changed.max()))
+
+
+def test_bad_file_does_not_abort_directory(volumes):
+    directory, _ = volumes
+    (directory / "tomogram_bad.mrc").write_bytes(b"0123456789")
+    truncated = (directory / "tomogram_1.mrc").read_bytes()[:2000]
+    (directory / "tomogram_cut.mrc").write_bytes(truncated)
+    results = TomogramStatistics(workers=2).compute_directory(str(directory))
+    assert "too small" in results[str(directory / "tomogram_bad.mrc")]["error"]
+    assert "truncated" in results[str(directory / "tomogram_cut.mrc")]["error"]
+    assert results[str(directory / "tomogram_1.mrc")]["mean"] is not None
+
+
+def test_nonfinite_voxels_are_excluded(tmp_path):
+    data = np.arange(2 * 4 * 4, dtype=np.float32).reshape(2, 4, 4)
+    data[0, 0, 0] = np.nan
+    data[1, 0, 0] = np.inf
+    write_mrc(tmp_path / "tomogram_nan.mrc", data, 2)
+    stats = TomogramStatistics(workers=1, cache_dir=tmp_path / ".cache").compute_directory(str(tmp_path))
+    stats = stats[str(tmp_path / "tomogram_nan.mrc")]
+    finite = data[np.isfinite(data)].astype(np.float64)
+    assert stats["nonfinite_voxels"] == 2
+    assert stats["mean"] == pytest.approx(finite.mean())
+    assert stats["min"] == finite.min() and stats["max"] == finite.max()
+    assert sum(stats["histogram"]["counts"]) == finite.size
+    json.dumps(stats, allow_nan=False)
+
+
+def test_constant_volume_contrast_limits(tmp_path):
+    write_mrc(tmp_path / "tomogram_flat.mrc", np.full((3, 4, 4), 3.0, dtype=np.float32), 2)
+    stats = TomogramStatistics(workers=1).compute_directory(str(tmp_path))[str(tmp_path / "tomogram_flat.mrc")]
+    assert stats["contrast_limits"]["low"] == stats["contrast_limits"]["high"] == 3.0
+    assert stats["std"] == 0.0
+
+
+def test_cli_writes_strict_json(volumes, capsys):
+    directory, _ = volumes
+    output = directory / "stats.json"
+    main([str(directory), "--workers", "1", "--output", str(output)])
+    assert len(json.loads(output.read_text())) == 2
+    assert "tomogram_1.mrc" in capsys.readouterr().out